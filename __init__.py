@@ -3,93 +3,336 @@ Initializes EEWREST's Flask app module.
 Registers the Flask Blueprint containing all API routes.
 """
 
+import hashlib
 import logging
 import os
+import pickle
+import queue
+import stat
 import sys
-import toml
-from logging.handlers import TimedRotatingFileHandler
+import tempfile
+import threading
+import time
+import tomllib
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    TimedRotatingFileHandler
+)
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
 
+import orjson
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider, JSONProvider
 
 from .views import api
 
 
+# EEWRest module dir (dir containing __init__.py). Resolved once at import.
+_MODULE_DIR: Path = Path(__file__).resolve().parent
+
 # App config type alias to be used in type hints.
 ConfigType = Union[str, Path, Dict[str, Any]]
 
+# Env var used to opt in to the parsed config file cache.
+CONFIG_CACHE_ENV_VAR = 'EEWREST_CONFIG_CACHE'
 
-DEFAULT_CONFIG_PATH: Path = (
-    Path(__file__).parent / 'params/EEWRESTProperties.toml'
-)
 
+DEFAULT_CONFIG_PATH: Path = _MODULE_DIR / 'params/EEWRESTProperties.toml'
 
-def get_project_info() -> str:
+
+class CachedTimeFormatter(logging.Formatter):
     """
-    Return data found in pyproject.toml's project table.
-    :return: The parent module version string.
-    :rtype: str
+    Log formatter that reuses the formatted asctime string for records
+    created within the same second, so time.strftime() and the time
+    converter run at most once per second instead of once per record.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (epoch second, formatted time str) tuple. Swapped as one object
+        # so concurrent logging threads never see a mismatched pair.
+        self._last_time: Tuple[Optional[int], str] = (None, '')
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+
+        created_sec = int(record.created)
+        last_sec, time_str = self._last_time
+        if created_sec != last_sec:
+            time_str = time.strftime(
+                self.default_time_format,
+                self.converter(record.created)
+            )
+            self._last_time = (created_sec, time_str)
+        return self.default_msec_format % (time_str, record.msecs)
+
+
+class ProcessLocalQueueHandler(QueueHandler):
+    """
+    Queue handler that hands records to a QueueListener thread, so logging
+    threads never block on the target handler's I/O (eg. log file writes).
+    .. note:: The listener is started lazily by the first record logged in
+        each process.  Listener threads don't survive a fork, so a prefork
+        server (eg. gunicorn with preload) gets a fresh queue and listener
+        in every worker instead of queueing records nothing drains.
+        The listener is stopped (and its queue flushed) when the handler is
+        closed, which logging.shutdown() does at interpreter exit.
+    """
+
+    def __init__(self, target: logging.Handler):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self._listener: Optional[QueueListener] = None
+        self._listener_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        super().enqueue(record)
+
+    def _start_listener(self) -> None:
+        with self._start_lock:
+            pid = os.getpid()
+            if self._listener_pid == pid:
+                return
+            # Records queued before a fork belong to the parent's listener.
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(
+                self.queue,
+                self.target,
+                respect_handler_level=True
+            )
+            self._listener.start()
+            self._listener_pid = pid
+
+    def close(self) -> None:
+        # Called by logging.shutdown() at exit.  Stopping the listener
+        # flushes queued records to the target handler.
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+        self._listener = self._listener_pid = None
+        super().close()
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider that encodes/decodes request and response bodies
+    using orjson (C extension) instead of the stdlib json module.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default).decode()
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+def _load_project_info() -> Optional[Dict[str, Any]]:
+    """
+    Parse pyproject.toml and return its project table.
+    :return: The project table dict or None if pyproject.toml is unreadable.
+    :rtype: Optional[Dict[str, Any]]
     """
     try:
-        pyproject_toml_path = Path(__file__).parent / 'pyproject.toml'
-        pyproject_toml = toml.load(str(pyproject_toml_path))
+        pyproject_toml_path = _MODULE_DIR / 'pyproject.toml'
+        with open(pyproject_toml_path, 'rb') as pyproject_toml_f:
+            pyproject_toml = tomllib.load(pyproject_toml_f)
     except Exception as exc:
         print('Unable to parse pyproject.toml for project info.')
         print(exc)
         return None
     return pyproject_toml.get('project')
 
-def validate_config(app: Flask) -> None:
-    app.logger.info('Beginning app config validation.')
 
-    # Make sure we can read/write to current dir.
-    eewrest_home_dir = app.config.get('EEW_RESTHome')
-    if not os.access(eewrest_home_dir, os.R_OK | os.W_OK):
-        app.logger.fatal(
-            f'Unable to write to EEWRest home dir: {eewrest_home_dir}. '
-            'Please check dir permissions.'
-        )
-        sys.exit(1)
+# Project info is static, so pyproject.toml is parsed once at import.
+_PROJECT_INFO: Optional[Dict[str, Any]] = _load_project_info()
 
-    # Check JVM config (used to run ProductClient.jar)
-    jvm_path = Path(app.config.get('Java'))
-    if not (jvm_path and jvm_path.is_file()):
-        app.logger.fatal(
-            'Undefined Java JVM path. Provided a valid '
-            'JVM path via config file parameter "Java".'
-        )
-        sys.exit(1)
-    if not os.access(jvm_path, os.R_OK | os.X_OK):
-        app.logger.fatal(
-            'Java JVM permissions error. '
-            f'Read and execute must be allowed for {jvm_path}'
+
+def get_project_info() -> Optional[Dict[str, Any]]:
+    """
+    Return data found in pyproject.toml's project table.
+    :return: The project table parsed from pyproject.toml at import time.
+    :rtype: Optional[Dict[str, Any]]
+    """
+    return _PROJECT_INFO
+
+
+def load_config_file(config_file: Path) -> Dict[str, Any]:
+    """
+    Load app config from a TOML file.
+    .. note:: If env var EEWREST_CONFIG_CACHE=1, the parsed config is pickled
+        to <config_file>.cache along with a blake2b digest of the TOML file.
+        Later loads reuse the cached config while the digest still matches,
+        skipping the TOML parse.  The cache is written to a temp file and
+        moved into place so concurrent workers never read a partial file.
+    :param config_file: Path to the TOML config file.
+    :type config_file: Path
+    :return: Parsed config dictionary.
+    :rtype: Dict[str, Any]
+    """
+    config_bytes = config_file.read_bytes()
+    if os.environ.get(CONFIG_CACHE_ENV_VAR) != '1':
+        return tomllib.loads(config_bytes.decode('utf-8'))
+
+    digest = hashlib.blake2b(config_bytes).digest()
+    cache_file = config_file.with_name(config_file.name + '.cache')
+
+    # Use cached config if it was built from the current TOML file.
+    try:
+        with open(cache_file, 'rb') as cache_f:
+            cached_digest, cached_config = pickle.load(cache_f)
+        if cached_digest == digest:
+            return cached_config
+    except Exception:
+        pass  # Missing, stale or unreadable cache. Rebuild below.
+
+    config = tomllib.loads(config_bytes.decode('utf-8'))
+    tmp_path = None
+    try:
+        tmp_fd, tmp_path = tempfile.mkstemp(
+            dir=cache_file.parent,
+            prefix=f'{cache_file.name}.',
+            suffix='.tmp'
         )
-        sys.exit(1)
+        with os.fdopen(tmp_fd, 'wb') as cache_f:
+            pickle.dump((digest, config), cache_f)
+        os.replace(tmp_path, cache_file)
+    except OSError as exc:
+        print(f'Unable to write config cache file: {cache_file}.')
+        print(exc)
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    return config
+
+
+class PathProbe(NamedTuple):
+    """
+    File type of a path, taken from a single stat.
+    """
+    exists: bool
+    is_file: bool
+    is_dir: bool
+
+
+def _probe(path: Union[str, Path]) -> PathProbe:
+    """
+    Stat a path once and derive its file type from the result.
+    .. note:: Access permissions are checked separately with a single
+        os.access() call (see _check_config_path), so ACLs, read-only
+        mounts and root's permissions are taken into account.
+    :param path: Path to probe.
+    :type path: Union[str, Path]
+    :return: Path type flags.
+    :rtype: PathProbe
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return PathProbe(False, False, False)
+
+    return PathProbe(
+        exists=True,
+        is_file=stat.S_ISREG(mode),
+        is_dir=stat.S_ISDIR(mode)
+    )
+
+
+class ConfigPathCheck(NamedTuple):
+    """
+    Startup validation rule for a path found in the app config.
+    """
+    key: str  # App config key holding the path.
+    mode: int  # Required access as os.R_OK, os.W_OK, os.X_OK bit flags.
+    kind: str  # Required path type: 'file', 'dir' or 'dir_create'.
+    kind_err_msg: str  # Logged if path type is wrong. Formatted w/ {path}.
+    access_err_msg: str  # Logged if access is denied. Formatted w/ {path}.
+
 
+# Config paths validated on startup (in order) by validate_config().
+_CONFIG_CHECKS: Tuple[ConfigPathCheck, ...] = (
+    # Make sure we can read/write to current dir.
+    ConfigPathCheck(
+        'EEW_RESTHome', os.R_OK | os.W_OK, 'dir',
+        'Unable to write to EEWRest home dir: {path}. '
+        'Please check dir permissions.',
+        'Unable to write to EEWRest home dir: {path}. '
+        'Please check dir permissions.'
+    ),
+    # Check JVM config (used to run ProductClient.jar)
+    ConfigPathCheck(
+        'Java', os.R_OK | os.X_OK, 'file',
+        'Undefined Java JVM path. Provided a valid '
+        'JVM path via config file parameter "Java".',
+        'Java JVM permissions error. '
+        'Read and execute must be allowed for {path}'
+    ),
     # Check path to ProductClient.jar
-    pdl_client_jar_path = Path(app.config.get('ProductClient'))
-    if not (pdl_client_jar_path and pdl_client_jar_path.is_file()):
-        app.logger.fatal(
-            'Undefined ProductClient.jar path. Provided a valid '
-            'executable path via config file parameter "ProductClient".'
-        )
-        sys.exit(1)
-    if not os.access(pdl_client_jar_path, os.R_OK):
-        app.logger.fatal(
-            f'Permissions error. Unable to read: {pdl_client_jar_path}.'
-        )
-        sys.exit(1)
-
-    # Check archive path for rw permissions.
-    archive_path = Path(app.config.get('ArchiveDir'))
-    if not archive_path.is_dir():
-        archive_path.mkdir(mode=0o777)
-    if not os.access(archive_path, os.R_OK | os.W_OK):
-        app.logger.fatal(
-            f'Permissions error. Unable to read: {archive_path}.'
-        )
-        sys.exit(1)
+    ConfigPathCheck(
+        'ProductClient', os.R_OK, 'file',
+        'Undefined ProductClient.jar path. Provided a valid '
+        'executable path via config file parameter "ProductClient".',
+        'Permissions error. Unable to read: {path}.'
+    ),
+    # Check archive path for rw permissions (created if missing).
+    ConfigPathCheck(
+        'ArchiveDir', os.R_OK | os.W_OK, 'dir_create',
+        'Unable to create archive dir: {path}.',
+        'Permissions error. Unable to read: {path}.'
+    ),
+)
+
+
+def _check_config_path(app: Flask,
+                       check: ConfigPathCheck,
+                       value: Union[str, Path]) -> bool:
+    """
+    Validate the type and access permissions of a config path.
+    Logs a fatal message describing the first failed requirement.
+    :param app: Flask app used for logging.
+    :type app: Flask
+    :param check: Validation rule for the config path.
+    :type check: ConfigPathCheck
+    :param value: Config value of check.key.
+    :type value: Union[str, Path]
+    :return: True if the path is valid, else False.
+    :rtype: bool
+    """
+    path = Path(value)
+    probe = _probe(path)
+
+    if check.kind == 'dir_create' and not probe.is_dir:
+        try:
+            path.mkdir(mode=0o777)
+        except OSError:
+            app.logger.fatal(check.kind_err_msg.format(path=path))
+            return False
+        probe = PathProbe(exists=True, is_file=False, is_dir=True)
+
+    if not (probe.is_file if check.kind == 'file' else probe.is_dir):
+        app.logger.fatal(check.kind_err_msg.format(path=path))
+        return False
+
+    if not os.access(path, check.mode):
+        app.logger.fatal(check.access_err_msg.format(path=path))
+        return False
+
+    return True
+
+
+def validate_config(app: Flask) -> None:
+    app.logger.info('Beginning app config validation.')
+
+    cfg = app.config
+    for check in _CONFIG_CHECKS:
+        if not _check_config_path(app, check, cfg.get(check.key)):
+            sys.exit(1)
 
     app.logger.info('Completed app config validation.')
 
@@ -108,17 +351,20 @@ def create_app(config: Optional[ConfigType] = None):
         default app creation function name.
     """
     app = Flask(__name__)
+    cfg = app.config
+    app.json = OrjsonProvider(app)
 
     # Init log formatter
-    formatter = logging.Formatter(
+    formatter = CachedTimeFormatter(
         '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
     )
 
     # Init handler to default stdout stream
     handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(formatter)
 
     if isinstance(config, dict):  # Check config dictionary
-        app.config.update(config)
+        cfg.update(config)
     else:  # Check for config file
         if config is not None:
             config_file: Path = Path(config).absolute()
@@ -137,34 +383,38 @@ def create_app(config: Optional[ConfigType] = None):
             sys.exit(1)
 
         # Load flask app config from TOML file.
-        config = toml.load(str(config_file))
-        app.config.update(config)
+        config = load_config_file(config_file)
+        cfg.update(config)
 
         # Set log level.
-        if app.config.get('DEBUG'):
+        if cfg.get('DEBUG'):
             app.logger.setLevel(logging.DEBUG)
         else:
             # Set to logging.INFO to ignore debug messages.
             app.logger.setLevel(logging.INFO)
 
         # Get log path.  Print error if log dir doesn't exist.
-        log_dir: Path = Path(str(app.config.get('LogDir')))
+        log_dir: Path = Path(str(cfg.get('LogDir')))
         if log_dir is not None:
             log_file_path: Path = log_dir / 'EEWREST.log'
             if not log_dir.is_dir():
                 print(f'Log dir does not exist at path: {log_dir}.')
                 sys.exit(1)
             else:
-                # log dir configured, override handler to use file handler.
-                handler = TimedRotatingFileHandler(
+                file_handler = TimedRotatingFileHandler(
                     log_file_path,
                     when="d",
                     interval=1,
                     backupCount=60
                 )
+                file_handler.setFormatter(formatter)
 
-    # Register log handler and formatter to Flask app logger.
-    handler.setFormatter(formatter)
+                # Log dir configured, override handler to queue log records.
+                # Records are written to file by a listener thread started
+                # in the process that logs them (see ProcessLocalQueueHandler).
+                handler = ProcessLocalQueueHandler(file_handler)
+
+    # Register log handler to Flask app logger.
     app.logger.addHandler(handler)
 
     # Read project info for project module name and version.
@@ -183,26 +433,27 @@ def create_app(config: Optional[ConfigType] = None):
     )
 
     # Set EEWRest Home dir (dir containing __init__.py) to default if unset.
-    if not app.config.get('EEW_RESTHome'):
-        app.config['EEW_RESTHome'] = Path(__file__).parent
+    if not cfg.get('EEW_RESTHome'):
+        cfg['EEW_RESTHome'] = _MODULE_DIR
         app.logger.info(
             'Config value "EEW_RESTHome" is undefined. '
-            f'Using default: {app.config.get("EEW_RESTHome")}'
+            f'Using default: {cfg.get("EEW_RESTHome")}'
         )
 
     # Inject default archive path if not provided (for backward compat).
-    if not app.config.get('ArchiveDir'):
-        app.config['ArchiveDir'] = Path(app.config['EEW_RESTHome']) / 'archive'
+    if not cfg.get('ArchiveDir'):
+        cfg['ArchiveDir'] = Path(cfg['EEW_RESTHome']) / 'archive'
 
     app.logger.info(
-        f"EEWRest Home Dir: {app.config['EEW_RESTHome']}"
+        f"EEWRest Home Dir: {cfg['EEW_RESTHome']}"
     )
     app.logger.info(
-        f"GeoJSON Archive Dir: {app.config['ArchiveDir']}"
+        f"GeoJSON Archive Dir: {cfg['ArchiveDir']}"
     )
 
     # Validate config parameters on startup, log and exit if invalid.
-    if not app.config['TESTING']:  # Skip if unit testing
+    testing = cfg.get('TESTING', False)
+    if not testing:  # Skip if unit testing
         validate_config(app)
 
     app.register_blueprint(api)
@@ -1,36 +1,66 @@
 """
 Pytest fixtures.
 """
+import functools
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
 import pytest
+from flask import Flask
 
-from .. import create_app
+from .. import create_app, views
 
 
 MOCK_RSA_KEY_PATH = '/example/eewrest/key/path/id_rsa'
 MOCK_PDL_CONF_PATH = '/unittest_ProductClient.ini'
 MOCK_JAR_PATH = '/example/eewrest/ProductClient.jar'
 
+INPUT_DIR = Path(__file__).parent / 'input'
+PARAMS_DIR = Path(__file__).parent.parent / 'params'
+
+
+# App config used by the app fixture.
+APP_CONFIG: Dict[str, Any] = {
+    'TESTING': True,  # Flask builtin
+    'DEBUG': True,  # Flask builtin
+    'Port': 5001,
+    'SkipPDLSend': False,
+    'Java': '/usr/bin/java',
+    'EEW_RESTHome': '/app/EEWREST/',
+    'ProductClient': f'{MOCK_JAR_PATH}',
+    'ProductClientConfig': f'{MOCK_PDL_CONF_PATH}',
+    'SSHPrivateKey': f'{MOCK_RSA_KEY_PATH}'
+}
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_create_app(config_items: Tuple[Tuple[str, Any], ...]) -> Flask:
+    return create_app(dict(config_items))
+
+
+def get_app(config: Dict[str, Any]) -> Flask:
+    """
+    Returns a Flask app instance for the given config.  Apps are cached by
+    config, so identical configs share one app instance.
+    .. note:: Configs containing unhashable values are not cached.
+    :param config: Flask app config dictionary.
+    :return: A configured Flask app instance.
+    """
+    config_items = tuple(sorted(config.items()))
+    try:
+        hash(config_items)
+    except TypeError:  # Unhashable config value
+        return create_app(config)
+    return _cached_create_app(config_items)
+
 
 @pytest.fixture(scope='session')
 def app():
     """
-    Generates a fresh Flask app instance.
+    Generates a Flask app instance.
     :yield: A configured Flask app instance.
     """
-
-    app = create_app({
-        'TESTING': True,  # Flask builtin
-        'DEBUG': True,  # Flask builtin
-        'Port': 5001,
-        'SkipPDLSend': False,
-        'Java': '/usr/bin/java',
-        'EEW_RESTHome': '/app/EEWREST/',
-        'ProductClient': f'{MOCK_JAR_PATH}',
-        'ProductClientConfig': f'{MOCK_PDL_CONF_PATH}',
-        'SSHPrivateKey': f'{MOCK_RSA_KEY_PATH}'
-    })
-
-    yield app
+    yield get_app(APP_CONFIG)
 
 
 @pytest.fixture(scope='session')
@@ -40,3 +70,35 @@ def client(app):
     Use this fixture to simulate client requests.
     """
     yield app.test_client()
+
+
+@pytest.fixture(scope='session')
+def true_alert_payload():
+    """
+    Confirmed alert JSON payload read from the test input dir.
+    Read once per session since the file content is constant.
+    :return: JSON payload str.
+    """
+    return (INPUT_DIR / 'true_alert.json').read_text()
+
+
+@pytest.fixture(scope='session')
+def qml_template_text():
+    """
+    QuakeML cancel message template read from the app params dir.
+    Read once per session since the file content is constant.
+    :return: QuakeML template str.
+    """
+    return (PARAMS_DIR / 'QuakeML_EEWTemplate.xml').read_text()
+
+
+@pytest.fixture
+def clear_quakeml_template_cache():
+    """
+    Clears the cached QuakeML template before and after a test.  Lets a
+    test read the template through a mocked open function without leaking
+    the mocked content into later tests.
+    """
+    views._read_quakeml_template_bytes.cache_clear()
+    yield
+    views._read_quakeml_template_bytes.cache_clear()
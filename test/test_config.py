@@ -0,0 +1,163 @@
+"""
+Tests helper functions and classes used by the Flask app factory.
+"""
+import logging
+import os
+import pickle
+
+import pytest
+
+from .. import (
+    CONFIG_CACHE_ENV_VAR,
+    CachedTimeFormatter,
+    ProcessLocalQueueHandler,
+    _CONFIG_CHECKS,
+    _probe,
+    create_app,
+    load_config_file,
+    validate_config
+)
+
+
+def test_load_config_file(tmp_path, monkeypatch):
+    config_file = tmp_path / 'EEWRESTProperties.toml'
+    config_file.write_text('SkipPDLSend = true\nJava = "/usr/bin/java"\n')
+    cache_file = tmp_path / 'EEWRESTProperties.toml.cache'
+
+    # Cache is opt-in, so no cache file is written by default.
+    monkeypatch.delenv(CONFIG_CACHE_ENV_VAR, raising=False)
+    config = load_config_file(config_file)
+    assert config == {'SkipPDLSend': True, 'Java': '/usr/bin/java'}
+    assert not cache_file.exists()
+
+
+def test_load_config_file_cache(tmp_path, monkeypatch):
+    config_file = tmp_path / 'EEWRESTProperties.toml'
+    config_file.write_text('Java = "/usr/bin/java"\n')
+    cache_file = tmp_path / 'EEWRESTProperties.toml.cache'
+    monkeypatch.setenv(CONFIG_CACHE_ENV_VAR, '1')
+
+    # First load parses the TOML file and writes the cache.
+    assert load_config_file(config_file) == {'Java': '/usr/bin/java'}
+    assert cache_file.is_file()
+
+    # Matching digest returns the cached config without parsing TOML.
+    with open(cache_file, 'rb') as cache_f:
+        digest, _ = pickle.load(cache_f)
+    with open(cache_file, 'wb') as cache_f:
+        pickle.dump((digest, {'Java': '/cached/java'}), cache_f)
+    assert load_config_file(config_file) == {'Java': '/cached/java'}
+
+    # Editing the TOML file invalidates the cache.
+    config_file.write_text('Java = "/opt/java"\n')
+    assert load_config_file(config_file) == {'Java': '/opt/java'}
+    assert load_config_file(config_file) == {'Java': '/opt/java'}
+
+    # Cache is moved into place, so no temp files are left behind.
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'EEWRESTProperties.toml',
+        'EEWRESTProperties.toml.cache'
+    ]
+
+
+def test_load_config_file_cache_name(tmp_path, monkeypatch):
+    # Cache file name is <config_file>.cache for any config file suffix.
+    config_file = tmp_path / 'eewrest.conf'
+    config_file.write_text('Java = "/usr/bin/java"\n')
+    monkeypatch.setenv(CONFIG_CACHE_ENV_VAR, '1')
+
+    assert load_config_file(config_file) == {'Java': '/usr/bin/java'}
+    assert (tmp_path / 'eewrest.conf.cache').is_file()
+
+
+def test_probe(tmp_path):
+    assert _probe(tmp_path / 'missing') == (False, False, False)
+    assert _probe(tmp_path) == (True, False, True)
+
+    file_path = tmp_path / 'ProductClient.jar'
+    file_path.write_bytes(b'')
+    assert _probe(file_path) == (True, True, False)
+
+
+def test_cached_time_formatter():
+    fmt = '%(asctime)s %(message)s'
+    formatter = CachedTimeFormatter(fmt)
+    std_formatter = logging.Formatter(fmt)
+
+    # Records in the same second reuse the cached time, but keep their msecs.
+    for created in (1665147161.25, 1665147161.75, 1665147162.5):
+        record = logging.makeLogRecord({'msg': 'foo', 'created': created})
+        record.msecs = (created - int(created)) * 1000
+        assert formatter.format(record) == std_formatter.format(record)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_process_local_queue_handler():
+    target = _ListHandler()
+    handler = ProcessLocalQueueHandler(target)
+
+    def log(msg):
+        handler.handle(
+            logging.makeLogRecord({'msg': msg, 'levelno': logging.INFO})
+        )
+
+    # Listener is only started once a record is logged.
+    assert handler._listener is None
+    log('foo')
+    first_queue, first_listener = handler.queue, handler._listener
+    assert first_listener is not None
+
+    # A process without its own listener (eg. a forked worker) starts a new
+    # listener on a fresh queue.
+    handler._listener_pid = -1
+    log('bar')
+    assert handler.queue is not first_queue
+    assert handler._listener is not first_listener
+    first_listener.stop()
+
+    # Closing stops the listener after draining queued records.
+    handler.close()
+    assert target.messages == ['foo', 'bar']
+
+
+def test_validate_config(tmp_path, mocker):
+    java_path = tmp_path / 'java'
+    java_path.write_bytes(b'')
+    java_path.chmod(0o755)
+    jar_path = tmp_path / 'ProductClient.jar'
+    jar_path.write_bytes(b'')
+    archive_dir = tmp_path / 'archive'
+
+    app = create_app({
+        'TESTING': True,
+        'EEW_RESTHome': str(tmp_path),
+        'Java': str(java_path),
+        'ProductClient': str(jar_path),
+        'ArchiveDir': str(archive_dir)
+    })
+
+    # Valid config passes and creates the missing archive dir.  Access is
+    # checked with one os.access() call per config path.
+    m_access_fn = mocker.spy(os, 'access')
+    validate_config(app)
+    assert archive_dir.is_dir()
+    assert m_access_fn.call_count == len(_CONFIG_CHECKS)
+
+    # JVM must be executable.
+    java_path.chmod(0o644)
+    with pytest.raises(SystemExit):
+        validate_config(app)
+    java_path.chmod(0o755)
+
+    # ProductClient.jar must exist.
+    app.config['ProductClient'] = str(tmp_path / 'missing.jar')
+    with pytest.raises(SystemExit):
+        validate_config(app)
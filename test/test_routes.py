@@ -3,8 +3,10 @@ This module implements EEWREST Flask route unit tests using
 pytest and pytest-mock plugin.
 """
 
+import io
 import logging
 import os
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 from typing import List
@@ -17,9 +19,6 @@ from .. import views
 from .conftest import MOCK_JAR_PATH, MOCK_PDL_CONF_PATH, MOCK_RSA_KEY_PATH
 
 
-INPUT_DIR = os.path.join(os.path.dirname(__file__), 'input')
-
-
 def test_status_request(client):
     response = client.get('/foobar')
     assert response.status_code == 404
@@ -30,55 +29,29 @@ def test_invalid_status_request(client):
     Test invalid request.
     """
     response = client.get('/status')
-    exp_response = json.loads('{"message": "EEWREST ALIVE"}')
+    exp_response = {"message": "EEWREST ALIVE"}
     assert response.status_code == 200
     assert json.loads(response.get_data()) == exp_response
 
 
-def test_split_pdl_event_code():
-    """
-    Test helper function split_pdl_event_code(str).
-    """
-
-    src, code = views.split_pdl_event_code('ci123456789')
-    assert src == 'ci'
-    assert code == '123456789'
-
-    src, code = views.split_pdl_event_code('cidev123456789')
-    assert src == 'cidev'
-    assert code == '123456789'
-
-    '''
-    This would be unexpected from a PDL source, but checks default to 2 char
-    code when RSN source ID is not recognized.
-    '''
-    src, code = views.split_pdl_event_code('foo_bar12345')
-    assert src == 'fo'
-    assert code == 'o_bar12345'
-
-    # Should raise Exception since the product code (numeric part) len < 8.
-    with pytest.raises(ValueError):
-        src, code = views.split_pdl_event_code('nc1234567')
-
-    # Should raise Exception since there is no alphabetic RSN source ID.
-    with pytest.raises(ValueError):
-        src, code = views.split_pdl_event_code('123456789123')
-
-
 def test_request_contents_xml_file(app, mocker):
     """
     Test request for contents.xml sent from EEWREST back to ARC
     while building the confirmed follow-up PDL message.
     """
-    m_response_obj = mocker.patch('requests.models.Response', autospec=True)
-    m_response_obj.content = '<xml>foobar</xml>'  # mock xml content
+    m_response_obj = mocker.MagicMock()
+    m_response_obj.__enter__.return_value = m_response_obj
+    m_response_obj.raw = io.BytesIO(b'<xml>foobar</xml>')  # mock xml content
     m_get_req_fn = mocker.patch(
-        'requests.get',
+        'EEWRest.views._session.get',
         return_value=m_response_obj
     )
 
     # Expected val for path string returned by request_contents_xml_file()
-    exp_xml_file_path = str(Path(app.config["EEW_RESTHome"]) / 'contents.xml')
+    exp_xml_file_path = os.path.join(
+        app.config["EEW_RESTHome"],
+        'contents.xml'
+    )
 
     m_open_fn = mocker.mock_open()
     mocker.patch('builtins.open', m_open_fn)
@@ -86,12 +59,21 @@ def test_request_contents_xml_file(app, mocker):
     dummy_url = 'http://foo.example.com'
 
     # Call function under test
-    xml_file_path = views.request_contents_xml_file(url=dummy_url)
+    xml_file_path = views.request_contents_xml_file(
+        url=dummy_url,
+        dest_dir=app.config["EEW_RESTHome"]
+    )
     m_open_fn.assert_called_once_with(exp_xml_file_path, 'wb')
     assert exp_xml_file_path == xml_file_path
+    m_open_fn().write.assert_called_once_with(b'<xml>foobar</xml>')
 
     # Note: allow_redirects required since ARC runs behind a reverse proxy.
-    m_get_req_fn.assert_called_once_with(dummy_url, allow_redirects=True)
+    m_get_req_fn.assert_called_once_with(
+        dummy_url,
+        allow_redirects=True,
+        stream=True,
+        timeout=views.ARC_REQUEST_TIMEOUT
+    )
 
 
 def test_request_summary_pdf_file(app, mocker):
@@ -99,16 +81,18 @@ def test_request_summary_pdf_file(app, mocker):
     Test request for summary.pdf sent from EEWREST back to ARC
     while building the confirmed follow-up PDL message.
     """
-    m_response_obj = mocker.patch('requests.models.Response', autospec=True)
-    m_response_obj.content = 'foobar'  # mock pdf content
+    m_response_obj = mocker.MagicMock()
+    m_response_obj.__enter__.return_value = m_response_obj
+    m_response_obj.raw = io.BytesIO(b'foobar')  # mock pdf content
     m_get_req_fn = mocker.patch(
-        'requests.get',
+        'EEWRest.views._session.get',
         return_value=m_response_obj
     )
 
     # Expected val for path string returned by request_summary_pdf_file()
-    exp_pdf_file_path = str(
-        Path(app.config["EEW_RESTHome"]) / 'summary.pdf'
+    exp_pdf_file_path = os.path.join(
+        app.config["EEW_RESTHome"],
+        'summary.pdf'
     )
 
     m_open_fn = mocker.mock_open()
@@ -117,33 +101,46 @@ def test_request_summary_pdf_file(app, mocker):
     dummy_url = 'http://foo.example.com'
 
     # Call function under test
-    summary_pdf_path = views.request_summary_pdf_file(url=dummy_url)
+    summary_pdf_path = views.request_summary_pdf_file(
+        url=dummy_url,
+        dest_dir=app.config["EEW_RESTHome"]
+    )
     m_open_fn.assert_called_once_with(summary_pdf_path, 'wb')
     assert exp_pdf_file_path == summary_pdf_path
+    m_open_fn().write.assert_called_once_with(b'foobar')
 
     # Note: allow_redirects required since ARC runs behind a reverse proxy.
-    m_get_req_fn.assert_called_once_with(dummy_url, allow_redirects=True)
+    m_get_req_fn.assert_called_once_with(
+        dummy_url,
+        allow_redirects=True,
+        stream=True,
+        timeout=views.ARC_REQUEST_TIMEOUT
+    )
 
 
-def test_json2pdl_request(client, fp, mocker, caplog):
+@pytest.mark.parametrize('decode_payload', [False, True])
+def test_json2pdl_request(client, fp, mocker, caplog, true_alert_payload,
+                          decode_payload):
     """
     Test alert confirmation request.
     Checks correctness of command params passed to the PDL subprocess.
+    The payload is sent both as a JSON encoded str (as sent by ARC) and
+    as a JSON object.
     :param client: Flask client pytest fixture
     :param fp: subprocess mocking plugin pytest fixture
     :param mocker: Mock lib pytest fixture
     :param caplog: Log message capturing pytest fixture
+    :param true_alert_payload: Confirmed alert JSON payload pytest fixture
+    :param decode_payload: Send the payload as a JSON object if True
     """
     pdl_source_rsn_id = 'ew'
     pdl_product_code = '1659991460'
     pdl_event_code = f'{pdl_source_rsn_id}{pdl_product_code}'
 
-    json_payload: str = None
-    with open(os.path.join(INPUT_DIR, 'true_alert.json'), 'r') as json_input:
-        json_payload = json_input.read()
-
     contents_xml_path: str = '/example/contents.xml'
     summary_pdf_path: str = '/example/summary.pdf'
+    archive_dir_path: Path = Path('/example/archive/msg_dir')
+    summary_json_path: str = str(archive_dir_path / 'summary.json')
 
     # Expected PDL origin command that will run in the resulting subprocess.
     exp_pdl_cmd_list = [
@@ -156,7 +153,7 @@ def test_json2pdl_request(client, fp, mocker, caplog):
         f'--eventsourcecode={pdl_product_code}',
         '--property-review-status=reviewed',
         '--status=CONFIRMED',
-        '--file=summary.json',
+        f'--file={summary_json_path}',
         f'--privateKey={MOCK_RSA_KEY_PATH}',
         f'--file={contents_xml_path}',
         f'--file={summary_pdf_path}',
@@ -181,13 +178,20 @@ def test_json2pdl_request(client, fp, mocker, caplog):
         return_value=f'{summary_pdf_path}'
     )
 
-    # Mock geojson file archive function to skip it (no file produced by test).
-    mock_archive_fn: MagicMock = mocker.patch('EEWRest.views.archive_geojson')
+    # Mock archive dir creation function to skip it (no dir made by test).
+    mock_archive_fn: MagicMock = mocker.patch(
+        'EEWRest.views.create_archive_dir',
+        return_value=archive_dir_path
+    )
 
     # Patch open function so we capture the summary GeoJSON file.
     m_open_fn = mocker.mock_open()
     mocker.patch('builtins.open', m_open_fn)
 
+    json_payload = true_alert_payload
+    if decode_payload:
+        json_payload = json.loads(true_alert_payload)
+
     # Send HTTP POST request that we're trying to test
     response = client.post(
         f'/api/JSON2PDL/{pdl_event_code}',
@@ -197,11 +201,13 @@ def test_json2pdl_request(client, fp, mocker, caplog):
     assert response.status_code == 200
 
     mock_contents_xml_request_fn.assert_called_once_with(
-        'http://example.com/contents.xml'
+        'http://example.com/contents.xml',
+        client.application.config['EEW_RESTHome']
     )
 
     pdf_request_fn.assert_called_once_with(
-        'http://example.com/summary.pdf'
+        'http://example.com/summary.pdf',
+        client.application.config['EEW_RESTHome']
     )
 
     assert mock_archive_fn.call_args[0][0] == pdl_event_code
@@ -223,18 +229,148 @@ def test_json2pdl_request(client, fp, mocker, caplog):
     assert captured_cmd[2] == exp_jar_path  # eg. /app/pdl/ProductClient.jar
 
     # Check command options are all there (regardless of ordering).
+    captured_options = Counter(captured_cmd[3:])
     for exp_option in exp_pdl_cmd_list[3:]:
         # Each expected command parameter should appear exactally once.
-        assert captured_cmd.count(exp_option) == 1
+        assert captured_options[exp_option] == 1
 
-    # Check for summary.json creation
-    m_open_fn.assert_called_once_with('summary.json', 'w')
+    # Check for summary.json creation in the archive dir
+    m_open_fn.assert_called_once_with(summary_json_path, 'wb')
 
     # Check to make sure we writing to app.logger
     log_records: List[logging.LogRecord] = caplog.records
     assert len(log_records) > 0
 
 
+def test_json2pdl_archive_failure(client, fp, mocker, caplog,
+                                  true_alert_payload):
+    """
+    Test that the confirmation is still sent when the archive dir can't be
+    created.  The summary GeoJSON falls back to the working dir.
+    :param client: Flask client pytest fixture
+    :param fp: subprocess mocking plugin pytest fixture
+    :param mocker: Mock lib pytest fixture
+    :param caplog: Log message capturing pytest fixture
+    :param true_alert_payload: Confirmed alert JSON payload pytest fixture
+    """
+    fp.keep_last_process(True)
+    fp.register([fp.any()])
+
+    mocker.patch(
+        'EEWRest.views.request_contents_xml_file',
+        return_value='/example/contents.xml'
+    )
+    mocker.patch(
+        'EEWRest.views.request_summary_pdf_file',
+        return_value='/example/summary.pdf'
+    )
+    mocker.patch(
+        'EEWRest.views.create_archive_dir',
+        side_effect=FileNotFoundError('/missing/archive')
+    )
+    m_open_fn = mocker.mock_open()
+    mocker.patch('builtins.open', m_open_fn)
+
+    response = client.post(
+        '/api/JSON2PDL/ew1659991460',
+        json=true_alert_payload
+    )
+
+    assert response.status_code == 200
+    m_open_fn.assert_called_once_with('summary.json', 'wb')
+    assert len(fp.calls) == 1
+    assert '--file=summary.json' in fp.calls[0]
+
+    # Fallback file location is logged so it can be recovered.
+    fallback_path = os.path.abspath('summary.json')
+    assert any(
+        r.levelno == logging.ERROR and fallback_path in r.getMessage()
+        for r in caplog.records
+    )
+
+
+def test_json2pdl_missing_url(client, fp, mocker, true_alert_payload):
+    """
+    Test that no download is requested for a missing attachment URL and
+    the message is still sent with the remaining attachments.
+    :param client: Flask client pytest fixture
+    :param fp: subprocess mocking plugin pytest fixture
+    :param mocker: Mock lib pytest fixture
+    :param true_alert_payload: Confirmed alert JSON payload pytest fixture
+    """
+    fp.keep_last_process(True)
+    fp.register([fp.any()])
+
+    contents_request_fn: MagicMock = mocker.patch(
+        'EEWRest.views.request_contents_xml_file',
+        return_value='/example/contents.xml'
+    )
+    pdf_request_fn: MagicMock = mocker.patch(
+        'EEWRest.views.request_summary_pdf_file',
+        return_value='/example/summary.pdf'
+    )
+    mocker.patch(
+        'EEWRest.views.create_archive_dir',
+        return_value=Path('/example/archive/msg_dir')
+    )
+    mocker.patch('builtins.open', mocker.mock_open())
+
+    payload = json.loads(true_alert_payload)
+    payload['pas_pdf_file_url'] = None
+
+    response = client.post('/api/JSON2PDL/ew1659991460', json=payload)
+
+    assert response.status_code == 200
+    contents_request_fn.assert_called_once()
+    pdf_request_fn.assert_not_called()
+    assert len(fp.calls) == 1
+    assert '--file=/example/contents.xml' in fp.calls[0]
+    assert '--file=/example/summary.pdf' not in fp.calls[0]
+
+
+def test_json2pdl_large_int(client, fp, mocker, true_alert_payload):
+    """
+    Test that a summary GeoJSON holding an integer beyond 64 bits (valid
+    JSON that orjson can't encode) is still written and sent.
+    :param client: Flask client pytest fixture
+    :param fp: subprocess mocking plugin pytest fixture
+    :param mocker: Mock lib pytest fixture
+    :param true_alert_payload: Confirmed alert JSON payload pytest fixture
+    """
+    fp.keep_last_process(True)
+    fp.register([fp.any()])
+
+    mocker.patch(
+        'EEWRest.views.request_contents_xml_file',
+        return_value='/example/contents.xml'
+    )
+    mocker.patch(
+        'EEWRest.views.request_summary_pdf_file',
+        return_value='/example/summary.pdf'
+    )
+    mocker.patch(
+        'EEWRest.views.create_archive_dir',
+        return_value=Path('/example/archive/msg_dir')
+    )
+    m_open_fn = mocker.mock_open()
+    mocker.patch('builtins.open', m_open_fn)
+
+    large_int = 2 ** 70
+    payload = json.loads(true_alert_payload)
+    payload['pas_geojson'] = {'type': 'Feature', 'id': large_int}
+
+    # Payload sent as a JSON encoded str (as sent by ARC).
+    response = client.post(
+        '/api/JSON2PDL/ew1659991460',
+        json=json.dumps(payload)
+    )
+
+    assert response.status_code == 200
+    geojson_bytes = m_open_fn().write.call_args[0][0]
+    assert json.loads(geojson_bytes)['id'] == large_int
+    assert len(fp.calls) == 1
+
+
 def test_associate2pdl_request(client, fp, caplog):
     """
     Test origin association request.
@@ -300,16 +436,54 @@ def test_associate2pdl_request(client, fp, caplog):
     assert captured_cmd[2] == exp_jar_path  # eg. /app/pdl/ProductClient.jar
 
     # Check command options are all there (regardless of ordering)
+    captured_options = Counter(captured_cmd[3:])
     for exp_option in exp_pdl_cmd_list[3:]:
         # Each expected command parameter should appear exactally once
-        assert captured_cmd.count(exp_option) == 1
+        assert captured_options[exp_option] == 1
 
     # Check to make sure we writing to app.logger
     log_records: List[logging.LogRecord] = caplog.records
     assert len(log_records) > 0
 
 
-def test_cancel2pdl_request(client, fp, mocker, caplog):
+@pytest.mark.parametrize('java_options', [
+    ['-XX:TieredStopAtLevel=1', '-Xshare:auto'],
+    '-XX:TieredStopAtLevel=1 -Xshare:auto'
+])
+def test_pdl_java_options(client, fp, mocker, java_options):
+    """
+    Test that JVM options from config param JavaOptions are passed to java
+    ahead of the "-jar" option.
+    :param client: Flask client pytest fixture
+    :param fp: subprocess mocking plugin pytest fixture
+    :param mocker: mock lib pytest fixture
+    :param java_options: JavaOptions config value (list or str)
+    """
+    mocker.patch.dict(
+        client.application.config,
+        {'JavaOptions': java_options}
+    )
+
+    fp.keep_last_process(True)
+    fp.register([fp.any()])
+
+    response = client.get(
+        '/api/ASSOCIATE/?eventID=ew1665147160&otherID=uw61886506'
+    )
+    assert response.status_code == 200
+
+    captured_cmd = fp.calls[0]
+    assert captured_cmd[:5] == [
+        client.application.config['Java'],
+        '-XX:TieredStopAtLevel=1',
+        '-Xshare:auto',
+        '-jar',
+        client.application.config['ProductClient']
+    ]
+
+
+def test_cancel2pdl_request(client, fp, mocker, caplog, qml_template_text,
+                            clear_quakeml_template_cache):
     """
     Test origin cancellation request.
     Checks correctness of command params passed to the PDL subprocess
@@ -319,6 +493,8 @@ def test_cancel2pdl_request(client, fp, mocker, caplog):
     :param fp: subprocess mocking plugin pytest fixture
     :param mocker: mock lib pytest fixture
     :param caplog: Log message capturing pytest fixture
+    :param qml_template_text: QuakeML cancel template pytest fixture
+    :param clear_quakeml_template_cache: Template cache reset pytest fixture
     """
     pdl_source_rsn_id = 'ew'
     pdl_product_code = '1658979090'
@@ -358,11 +534,9 @@ def test_cancel2pdl_request(client, fp, mocker, caplog):
     # Tell fakeprocess to capture all subprocess calls
     fp.register([fp.any()])
 
-    params_dir = Path(__file__).parent.parent / 'params'
-    qml_template_path = params_dir / 'QuakeML_EEWTemplate.xml'
-    qml_template = open(qml_template_path, 'r')
-    m_open_fn = mocker.mock_open(read_data=qml_template.read())
-    qml_template.close()
+    # Template is read through the mocked open function (cache is cleared
+    # by the clear_quakeml_template_cache fixture).
+    m_open_fn = mocker.mock_open(read_data=qml_template_text)
     mocker.patch('builtins.open', m_open_fn)
 
     # Send HTTP GET request that we're trying to test
@@ -373,14 +547,18 @@ def test_cancel2pdl_request(client, fp, mocker, caplog):
     # Make sure open was called twice
     assert m_open_fn.call_count == 2
 
-    # Check QuakeML file temp write (Note: open called by xml library)
+    # Check QuakeML file temp write
     m_open_fn.assert_called_with(
         f'builds/QuakeMLBuild_{pdl_product_code}.xml',
-        'w',
-        encoding='utf-8',
-        errors='xmlcharrefreplace'
+        'wb'
     )
 
+    # Serialized QuakeML is written in a single call
+    m_open_fn().write.assert_called_once()
+    quakeml_bytes = m_open_fn().write.call_args[0][0]
+    assert quakeml_bytes.startswith(b'<?xml')
+    assert pdl_product_code.encode() in quakeml_bytes
+
     # Check for captured suprocess calls
     exp_sp_call_count = 2
     if len(fp.calls) < exp_sp_call_count:
@@ -401,9 +579,10 @@ def test_cancel2pdl_request(client, fp, mocker, caplog):
     assert cap_part_1_cmd[2] == exp_jar_path  # eg. /app/pdl/ProductClient.jar
 
     # Check command options are all there (regardless of ordering)
+    cap_part_1_options = Counter(cap_part_1_cmd[3:])
     for exp_option in exp_pdl_part_1_cmd_list[3:]:
         # Each expected command parameter should appear exactally once
-        assert cap_part_1_cmd.count(exp_option) == 1, (
+        assert cap_part_1_options[exp_option] == 1, (
             f'Part 1 PDL command missing option {exp_option}'
         )
 
@@ -416,9 +595,10 @@ def test_cancel2pdl_request(client, fp, mocker, caplog):
     assert cap_part_2_cmd[2] == exp_jar_path  # eg. /app/pdl/ProductClient.jar
 
     # Check command options are all there (regardless of ordering)
+    cap_part_2_options = Counter(cap_part_2_cmd[3:])
     for exp_option in exp_pdl_part_2_cmd_list[3:]:
         # Each expected command parameter should appear exactally once
-        assert cap_part_2_cmd.count(exp_option) == 1, (
+        assert cap_part_2_options[exp_option] == 1, (
             f'Part 2 PDL command missing option {exp_option}'
         )
 
@@ -466,11 +646,11 @@ def test_missing2pdl_request(client, fp, mocker, caplog):
     # Tell fakeprocess to capture all subprocess calls
     fp.register([fp.any()])
 
-    m_open_fn = mocker.mock_open(read_data=dummy_follow_up_text)
+    m_open_fn = mocker.mock_open()
     mocker.patch('builtins.open', m_open_fn)
 
-    # Mock os.rename fn.
-    m_os_rename_fn = mocker.patch('os.rename')
+    # Mock os.replace fn.
+    m_os_replace_fn = mocker.patch('os.replace')
 
     # Send HTTP POST request that we're trying to test
     response = client.post(request_url_w_args, data=dummy_follow_up_text)
@@ -493,18 +673,22 @@ def test_missing2pdl_request(client, fp, mocker, caplog):
     assert captured_cmd[2] == exp_jar_path  # eg. /app/pdl/ProductClient.jar
 
     # Check command options are all there (regardless of ordering)
+    captured_options = Counter(captured_cmd[3:])
     for exp_option in exp_pdl_cmd_list[3:]:
         # Each expected command parameter should appear exactally once
-        assert captured_cmd.count(exp_option) == 1
+        assert captured_options[exp_option] == 1
 
-    # Check for rename call to move missed.html file to archive dir.
-    m_os_rename_fn.assert_called_once()
+    # Check for replace call to move missing.html file to archive dir.
+    m_os_replace_fn.assert_called_once()
 
-    # Check rename() call params
-    # Expected: os.rename('missed.html', path_to_archive_dir)
-    call_args = m_os_rename_fn.call_args[0]  # get first call args
+    # Check replace() call params
+    # Expected: os.replace('missing.html', path_to_archive_dir)
+    call_args = m_os_replace_fn.call_args[0]  # get first call args
     assert len(call_args) == 2
     assert call_args[0] == 'missing.html'
+    assert call_args[1].startswith(
+        str(client.application.config['ArchiveDir'])
+    )
     assert call_args[1].endswith('missing.html')
 
     # Check to make sure we writing to app.logger
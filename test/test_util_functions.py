@@ -1,8 +1,14 @@
 """
 Tests utility functions used by Flask views.
 """
+import logging
+
 import pytest
-from ..views import split_pdl_event_code
+from ..views import (
+    PRODUCT_CLIENT_LOG_TAIL_BYTES,
+    _log_product_client_output,
+    split_pdl_event_code
+)
 
 
 def test_split_pdl_event_code():
@@ -14,15 +20,70 @@ def test_split_pdl_event_code():
     assert source == 'cidev'
     assert code == '012345678'
 
+    # Longest known prefix wins when the product code is not all digits.
+    source, code = split_pdl_event_code(event_code='cidev2023abcd')
+    assert source == 'cidev'
+    assert code == '2023abcd'
+
     source, code = split_pdl_event_code(event_code='ew1665147161')
     assert source == 'ew'
     assert code == '1665147161'
 
+    source, code = split_pdl_event_code(event_code='ci123456789')
+    assert source == 'ci'
+    assert code == '123456789'
+
+    # Trailing newline is not part of an all-digit product code.
+    source, code = split_pdl_event_code(event_code='nc12345678\n')
+    assert source == 'nc'
+    assert code == '12345678\n'
+
+    '''
+    This would be unexpected from a PDL source, but checks default to 2 char
+    code when RSN source ID is not recognized.
+    '''
+    source, code = split_pdl_event_code(event_code='foo_bar12345')
+    assert source == 'fo'
+    assert code == 'o_bar12345'
+
     with pytest.raises(ValueError):
         source, code = split_pdl_event_code(event_code='')
     with pytest.raises(ValueError):
         source, code = split_pdl_event_code(event_code=None)
     with pytest.raises(ValueError):
         source, code = split_pdl_event_code(event_code=1234567890)
+    with pytest.raises(ValueError):
+        source, code = split_pdl_event_code(event_code=['ew1665147161'])
+    with pytest.raises(ValueError):
+        source, code = split_pdl_event_code(event_code={})
     with pytest.raises(ValueError):
         source, code = split_pdl_event_code(event_code='1665147161')
+
+    # Should raise Exception since the product code (numeric part) len < 8.
+    with pytest.raises(ValueError):
+        source, code = split_pdl_event_code(event_code='nc1234567')
+
+    # Should raise Exception since there is no alphabetic RSN source ID.
+    with pytest.raises(ValueError):
+        source, code = split_pdl_event_code(event_code='123456789123')
+
+
+def test_split_pdl_event_code_warns_every_call(caplog):
+    # Unrecognized prefix warning must not be hidden by result caching.
+    for _ in range(2):
+        assert split_pdl_event_code('xx1665147161') == ('xx', '1665147161')
+    warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 2
+
+
+def test_log_product_client_output(caplog):
+    caplog.set_level(logging.INFO)
+    tail_len = PRODUCT_CLIENT_LOG_TAIL_BYTES
+    stdout_value = b'x' * (2 * tail_len) + b'send complete'
+    _log_product_client_output(stdout_value)
+
+    # Only the tail of the output is logged.
+    assert len(caplog.records) == 1
+    logged = caplog.records[0].getMessage()
+    assert logged.endswith('send complete')
+    assert logged.count('x') == tail_len - len('send complete')
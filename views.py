@@ -3,18 +3,26 @@ EEWREST API views module.  This module provides all Flask Blueprint object
 which defines views for sending ShakeAlert follow-up messages to PDL.
 """
 
+import functools
 import json
 import logging
 import os
 import requests
+import shlex
+import shutil
 import subprocess
-import time
-import xml.etree.ElementTree as ET
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from flask import current_app, request, Response, jsonify, Blueprint
+from flask.config import Config
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+import orjson
+from lxml import etree as ET
 
 
 api = Blueprint('api', __name__)
@@ -24,14 +32,62 @@ SOURCE_PREFIX_LIST = sorted([
     'bk', 'ci', 'cidev', 'ew', 'nc', 'nn', 'pt', 'us', 'uw'
 ])
 
+# RSN source codes grouped by length, and the lengths sorted longest first.
+# Lets split_pdl_event_code() find the longest matching prefix with one set
+# lookup per distinct prefix length.
+_PREFIXES_BY_LEN: Dict[int, FrozenSet[str]] = {
+    prefix_len: frozenset(
+        p for p in SOURCE_PREFIX_LIST if len(p) == prefix_len
+    )
+    for prefix_len in {len(p) for p in SOURCE_PREFIX_LIST}
+}
+_PREFIX_LENS_DESC: Tuple[int, ...] = tuple(
+    sorted(_PREFIXES_BY_LEN, reverse=True)
+)
+
 # Log message printed when PDL message transmission is disabled in config.
 PDL_DISABLED_LOG_TXT = (
     'PDL message unsent.  Skipped send step due to config SkipPDLSend=True. '
 )
 
+# Timeout (seconds) for HTTP requests sent back to ARC.
+ARC_REQUEST_TIMEOUT = 30
+
+# Chunk size (bytes) used to stream downloaded files to disk.
+DOWNLOAD_CHUNK_SIZE = 65536
+
+# Max number of trailing ProductClient output bytes written to the log.
+PRODUCT_CLIENT_LOG_TAIL_BYTES = 4096
+
+# QuakeML cancel message template path (relative to working dir).
+QUAKEML_TEMPLATE_PATH = '../params/QuakeML_EEWTemplate.xml'
+
+# QuakeML cancel message XML namespaces.
+QUAKEML_BED_NS = 'http://quakeml.org/xmlns/bed/1.2'
+QUAKEML_CATALOG_NS = 'http://anss.org/xmlns/catalog/0.1'
+
+# Clark notation QuakeML tag and attribute names used to compose messages.
+_BED = f'{{{QUAKEML_BED_NS}}}'
+_TAG_EVENT_PARAMETERS = _BED + 'eventParameters'
+_TAG_CREATION_INFO = _BED + 'creationInfo'
+_TAG_CREATION_TIME = _BED + 'creationTime'
+_TAG_EVENT = _BED + 'event'
+_ATTR_CATALOG_EVENTSOURCE = f'{{{QUAKEML_CATALOG_NS}}}eventsource'
+_ATTR_CATALOG_EVENTID = f'{{{QUAKEML_CATALOG_NS}}}eventid'
+
 logger = logging.getLogger(__name__)
 logger.propagate = True
 
+# Shared HTTP session so requests sent back to ARC reuse pooled keep-alive
+# connections instead of opening a new connection per request.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+
 
 class InvalidUsage(Exception):
     status_code = 400
@@ -49,6 +105,28 @@ class InvalidUsage(Exception):
         return rv
 
 
+@functools.lru_cache(maxsize=4096)
+def _lookup_prefix(event_code: str) -> Optional[Tuple[str, str]]:
+    """
+    Splits a PDL event code on the longest known RSN source ID prefix.
+    .. note:: Results are memoized since the same event codes are split
+        repeatedly (eg. ASSOCIATE requests, retries).  Keep this function
+        free of side effects (logging, raising) so caching it is safe.
+    :param event_code: A validated PDL "Event Code" str.
+    :type event_code: str
+    :return: Tuple containing the PDL source RSN ID and PDL Product code, or
+        None if the event code doesn't start with a known RSN ID.
+    :rtype: Optional[Tuple[str, str]]
+    """
+    # Match RSN id against known RSN prefixes (longest match wins).
+    for prefix_len in _PREFIX_LENS_DESC:
+        src_net_code = event_code[:prefix_len]
+        if src_net_code in _PREFIXES_BY_LEN[prefix_len]:
+            return src_net_code, event_code[prefix_len:]
+
+    return None
+
+
 def split_pdl_event_code(event_code: str) -> Tuple[str, str]:
     """
     Splits PDL's "Event Code" parameter which functions as the Origin
@@ -82,18 +160,9 @@ def split_pdl_event_code(event_code: str) -> Tuple[str, str]:
             f'allowed min length of {MIN_EVENT_CODE_LEN} characters.'
         )
 
-    src_net_code = None
-    product_code = None
-
-    # Match RSN id against sorted RSN prefix list (use longest match).
-    for rsn_id in SOURCE_PREFIX_LIST:
-        if event_code.startswith(rsn_id):
-            src_net_code = event_code[:len(rsn_id)]
-            product_code = event_code[len(rsn_id):]
-
-    # Return if a matching prefix was found.
-    if src_net_code is not None and product_code is not None:
-        return src_net_code, product_code
+    split_code = _lookup_prefix(event_code)
+    if split_code is not None:
+        return split_code
 
     # Default to first 2 chars of event code if RSN prefix not found.
     src_net_code = event_code[:2]
@@ -123,6 +192,15 @@ def split_pdl_event_code(event_code: str) -> Tuple[str, str]:
     return src_net_code, product_code
 
 
+def _utc_timestamp() -> str:
+    """
+    Returns the current UTC time formatted as "%Y-%m-%d %H:%M:%S".  Used to
+    timestamp received requests in logs and archive file names.
+    :rtype: str
+    """
+    return f'{datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S}'
+
+
 @api.route('/')
 @api.route('/status', methods=['GET'])
 def status():
@@ -135,70 +213,133 @@ def status():
     return response
 
 
-def request_contents_xml_file(url: str) -> str:
+def _download_to(url: str, dest: str) -> str:
+    """
+    Requests a file from an external HTTP server and writes it to dest.
+    :param url: HTTP URL for the file
+    :type url: str
+    :param dest: Path of the file to write.
+    :type dest: str
+    :return: Path str to the created file.
+    :rtype: str
+    """
+    # Note: allow_redirects required since ARC runs behind a reverse proxy.
+    with _session.get(
+        url,
+        allow_redirects=True,
+        stream=True,
+        timeout=ARC_REQUEST_TIMEOUT
+    ) as r:
+        r.raise_for_status()
+
+        # Stream response body to file in chunks instead of buffering it.
+        r.raw.decode_content = True
+        with open(dest, 'wb') as dest_f:
+            shutil.copyfileobj(r.raw, dest_f, length=DOWNLOAD_CHUNK_SIZE)
+
+    return dest
+
+
+def request_contents_xml_file(url: str, dest_dir: str) -> str:
     """
     Requests PDL's contest.xml from an external HTTP server and
     writes it to a file.
+    .. note:: Doesn't use current_app, so it can run in a worker thread.
     :param url: HTTP URL for the contents.xml file
     :type url: str
+    :param dest_dir: Dir to write contents.xml to (ie. EEW_RESTHome).
+    :type dest_dir: str
     :return: Path str to the created contents.xml file.
     :rtype: str
     """
-
-    # Send HTTP request to ARC for the contents file data
-    r = requests.get(url, allow_redirects=True)
-
-    # Write contents file data to file contents.xml
-    contents_file_path = os.path.join(
-        current_app.config.get('EEW_RESTHome'),
-        'contents.xml'
-    )
-    with open(contents_file_path, 'wb') as contents_xml_f:
-        contents_xml_f.write(r.content)
-
-    return contents_file_path
+    return _download_to(url, os.path.join(dest_dir, 'contents.xml'))
 
 
-def request_summary_pdf_file(url: str) -> str:
+def request_summary_pdf_file(url: str, dest_dir: str) -> str:
     """
     Requests Post ShakeAlert Message Summary from an external HTTP server and
     writes it to a file.
+    .. note:: Doesn't use current_app, so it can run in a worker thread.
     :param url: HTTP URL for the PDF file
     :type url: str
+    :param dest_dir: Dir to write summary.pdf to (ie. EEW_RESTHome).
+    :type dest_dir: str
     :return: Path str to the created PDF file.
     :rtype: str
     """
-    # Send HTTP request to ARC for the summary PDF file data
-    r = requests.get(url, allow_redirects=True)
+    return _download_to(url, os.path.join(dest_dir, 'summary.pdf'))
 
-    # Write PDF file data to file summary.pdf
-    pdf_file_path = os.path.join(
-        current_app.config.get('EEW_RESTHome'),
-        'summary.pdf'
+
+def create_archive_dir(uuid: str, timestamp: str) -> Path:
+    """
+    Creates the archive dir that holds the files sent in a PDL message.
+    .. note:: Files are written here directly (instead of being moved here
+        after sending) and keep their original names since PDL preserves
+        attachment file names.
+    :param uuid: PDL event code ie. ew1612345678
+    :type uuid: str
+    :param timestamp: Timestamp str to be used in the dir name.
+    :type timestamp: str
+    :return: Path to the archive dir <ArchiveDir>/<uuid>_<timestamp>
+    :rtype: Path
+    """
+    archive_dir = (
+        Path(current_app.config.get('ArchiveDir')) / f'{uuid}_{timestamp}'
     )
-    with open(pdf_file_path, 'wb') as summary_pdf_f:
-        summary_pdf_f.write(r.content)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    return archive_dir
 
-    return pdf_file_path
 
+def _write_bytes(path: str, data: bytes) -> str:
+    """
+    Writes data to a file, replacing any existing file content.
+    :param path: Path of the file to write.
+    :type path: str
+    :param data: File content.
+    :type data: bytes
+    :return: Path str to the written file.
+    :rtype: str
+    """
+    with open(path, 'wb') as dest_f:
+        dest_f.write(data)
+    return path
 
-def archive_geojson(uuid, timestamp) -> None:
+
+def write_summary_json(uuid: str, timestamp: str, geojson_bytes: bytes) -> str:
     """
-    Moves the current geojson file to an archival dir.
+    Writes the summary GeoJSON file sent in a JSON2PDL message to
+    <ArchiveDir>/<uuid>_<timestamp>/summary.json.
+    .. note:: An archive failure must not block the PDL send, so the file is
+        written to the working dir instead if it can't be written to the
+        archive dir.
     :param uuid: PDL event code ie. ew1612345678
     :type uuid: str
-    :param timestamp: Timestamp str to be used in the geojson filename.
+    :param timestamp: Timestamp str to be used in the archive dir name.
     :type timestamp: str
+    :param geojson_bytes: Serialized summary GeoJSON.
+    :type geojson_bytes: bytes
+    :return: Path str to the written summary.json file.
+    :rtype: str
     """
     try:
-        archive_dir = Path(current_app.config.get('ArchiveDir'))
-        os.rename('summary.json',  archive_dir / f'{uuid}_{timestamp}.json')
+        archive_dir = create_archive_dir(uuid, timestamp)
+        return _write_bytes(str(archive_dir / 'summary.json'), geojson_bytes)
     except Exception:
         logger.error(
-            'Unable to move summary.json to archive directory.',
+            'Unable to write summary.json to archive directory.',
             exc_info=True
         )
 
+    summary_path = _write_bytes('summary.json', geojson_bytes)
+    logger.error(
+        'Summary GeoJSON for %s written to working dir file %s instead of '
+        'the archive dir.  Copy it before the next JSON2PDL request '
+        'overwrites it.',
+        uuid,
+        os.path.abspath(summary_path)
+    )
+    return summary_path
+
 
 @api.route('/api/JSON2PDL/<uuid>', methods=['POST'])
 def JSON2PDL(uuid):
@@ -216,13 +357,13 @@ def JSON2PDL(uuid):
         Report PDF (summary.pdf)
     If request mime-type is not application/json or payload fails to parse as
     json, error code 400 is returned.
+    The summary GeoJSON file is written directly to the message's archive
+    dir (see write_summary_json).
     TODO: Make temp file path for content.xml and summary.pdf configurable
-    TODO: Write GeoJSON file to archive/dest dir on first pass instead of using
-          working dir and moving to archive at end of the request.
     :param uuid: A PDL code of the form <rsn_id>:<message_id_int>
     :type uuid: str
     """
-    timeStamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    timeStamp = _utc_timestamp()
     logger.info("Received a JSON2PDL with id %s at %s", uuid, timeStamp)
 
     # Init list to hold file attachments as cmd line options
@@ -230,69 +371,90 @@ def JSON2PDL(uuid):
     PDLAttach = list()
 
     # Get payload from request obj. Returns error 400 if payload is not json.
-    content = request.get_json()
-
-    logger.debug("data is: " + format(content))
-
-    # Parse received str/bytes payload into dict.
-    try:
-        data = json.loads(content)
-    except ValueError:
+    data = request.get_json()
+
+    logger.debug("data is: %s", data)
+
+    # Some clients (eg. ARC) send the payload as a JSON encoded str, so it
+    # must be parsed a second time.  Dict payloads are used as is.
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            data = None
+    if not isinstance(data, dict):
         logger.error("JSON was not valid")
         raise InvalidUsage('JSON sent was not valid')
 
     # Get contents file url from payload
     url_elem_name = 'contents_file_url'
-    url = data.get(url_elem_name)
-    if url is None:
+    contents_url = data.get(url_elem_name)
+    if contents_url is None:
         logger.error(
             f'Element "{url_elem_name}" missing from '
             'json payload or set to null.'
         )
 
-    # Request contents.xml file from ARC and attach it to PDL message.
-    try:
-        contents_file_path: str = request_contents_xml_file(url)
-        PDLAttach.append(f'--file={contents_file_path}')
-        logger.info("content.xml attached")
-    except Exception:
+    # Get summary PDF file url from payload
+    pdf_url_elem_name = 'pas_pdf_file_url'
+    pdf_url = data.get(pdf_url_elem_name)
+    if pdf_url is None:
         logger.error(
-            'Unable to open contents.xml file: %s',
-            contents_file_path
+            f'Element "{pdf_url_elem_name}" missing from '
+            'json payload or set to null.'
         )
-        pass
 
-    # Get contents file url from payload
-    try:
-        pdf_url_elem_name = 'pas_pdf_file_url'
-        url = data.get(pdf_url_elem_name)
-        if url is None:
-            raise InvalidUsage(
-                f'Element "{pdf_url_elem_name}" missing from '
-                'json payload or set to null.'
+    # Request contents.xml and summary PDF files from ARC concurrently.
+    # Downloads run in this request's own worker threads, so a slow ARC
+    # response only delays this request.  Missing URLs are skipped.
+    download_dir = current_app.config.get('EEW_RESTHome')
+    contents_future = pdf_future = None
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        if contents_url is not None:
+            contents_future = executor.submit(
+                request_contents_xml_file, contents_url, download_dir
+            )
+        if pdf_url is not None:
+            pdf_future = executor.submit(
+                request_summary_pdf_file, pdf_url, download_dir
             )
-    except Exception:
-        logger.error('Unable to retrieve PDF data from %s', url)
-        pass
 
-    # Request summary PDF from ARC and attach it to PDL message.
-    try:
-        pdf_file_path: str = request_summary_pdf_file(url)
-        PDLAttach.append(f'--file={pdf_file_path}')
-        logger.info("summary.pdf attached")
-    except Exception:
-        logger.error('Unable to open PDF file: %s', pdf_file_path)
-        pass
+    # Attach contents.xml file to PDL message.
+    if contents_future is not None:
+        try:
+            contents_file_path: str = contents_future.result()
+            PDLAttach.append(f'--file={contents_file_path}')
+            logger.info("content.xml attached")
+        except Exception:
+            logger.error(
+                'Unable to retrieve contents.xml from %s', contents_url
+            )
+
+    # Attach summary PDF to PDL message.
+    if pdf_future is not None:
+        try:
+            pdf_file_path: str = pdf_future.result()
+            PDLAttach.append(f'--file={pdf_file_path}')
+            logger.info("summary.pdf attached")
+        except Exception:
+            logger.error('Unable to retrieve summary.pdf from %s', pdf_url)
 
     # Extract nested geojson from the received json payload.
     geojson = data.get("pas_geojson")
     if geojson is None:
         logger.error('Summary GeoJSON element is missing or null.')
 
-    # Create Post ShakeAlert Summary GeoJSON file.
-    fileToSend = "summary.json"
-    with open(fileToSend, 'w') as summary_json_file:
-        json.dump(geojson, summary_json_file)
+    # Create Post ShakeAlert Summary GeoJSON file in the archive dir.
+    # Note: orjson writes compact UTF-8 JSON and encodes NaN/Infinity as null.
+    try:
+        geojson_bytes = orjson.dumps(geojson)
+    except orjson.JSONEncodeError:
+        # Values orjson can't encode (eg. integers beyond 64 bits, which the
+        # stdlib json parse of ARC's str payload keeps) use stdlib json.
+        logger.warning('Unable to encode summary GeoJSON with orjson.',
+                       exc_info=True)
+        geojson_bytes = json.dumps(geojson).encode('utf-8')
+    fileToSend = write_summary_json(uuid, timeStamp, geojson_bytes)
 
     source, code = split_pdl_event_code(uuid)
 
@@ -312,15 +474,12 @@ def JSON2PDL(uuid):
     else:
         logger.info(PDL_DISABLED_LOG_TXT)
 
-    # Archive summary geojson file.
-    archive_geojson(uuid, timeStamp)
-
     return jsonify({"uuid": uuid})
 
 
 @api.route('/api/ASSOCIATE/', methods=['GET'])
 def ASSOCIATE():
-    timeStamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    timeStamp = _utc_timestamp()
     eventID = request.args.get('eventID')
     otherID = request.args.get('otherID')
     if not eventID:
@@ -368,7 +527,7 @@ def CANCEL2PDL(uuid):
         Error case json example:
         { message: <error_message_text>, status=<err_code> }
     """
-    timeStamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    timeStamp = _utc_timestamp()
     logger.info(
         "Received a CANCEL2PDL with id %(ID)s at %(TIME)s",
         {"ID": uuid, "TIME": timeStamp}
@@ -424,7 +583,7 @@ def MISSING2PDL(uuid):
     :param uuid: The RSN id for the event that was missed by ShakeAlert.
         was missed by shakealert (eg. no alert issued).
     """
-    timeStamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    timeStamp = _utc_timestamp()
 
     # Get request payload containing html snippet text.
     logger.info(
@@ -439,24 +598,26 @@ def MISSING2PDL(uuid):
             as_text=True,
             parse_form_data=False
         )
-        logger.debug("data is: {!s}".format(content))
+        logger.debug("data is: %s", content)
 
         source, code = split_pdl_event_code(uuid)
         typeOfFile = "shake-alert"
         status = "MISSED"
 
         fileToSend = "missing.html"
-        with open(fileToSend, 'w') as f:
-            f.write(content)
-        f.close()
+        with open(fileToSend, 'w', encoding='utf-8') as missing_html_file:
+            missing_html_file.write(content)
 
         if not current_app.config.get('SkipPDLSend'):
             transferWithPDL(source, code, typeOfFile, status, fileToSend)
         else:
             logger.info(PDL_DISABLED_LOG_TXT)
-        os.rename(
-            "missing.html",
-            f'../archive/{uuid}_{timeStamp}_missing.html'
+        os.replace(
+            fileToSend,
+            os.path.join(
+                current_app.config['ArchiveDir'],
+                f'{uuid}_{timeStamp}_missing.html'
+            )
         )
 
         return jsonify({"uuid": uuid})
@@ -481,6 +642,41 @@ def handle_invalid_usage(error):
     return response
 
 
+def _product_client_cmd(cfg: Config) -> List[str]:
+    """
+    Builds the command prefix used to run ProductClient.jar.
+    .. note:: Optional config param "JavaOptions" (list or str) adds JVM
+        options ahead of "-jar".  Each PDL send starts a new JVM, so options
+        that cut JVM startup time (eg. -XX:TieredStopAtLevel=1 or an AppCDS
+        archive via -XX:SharedArchiveFile) speed up every send.
+    :param cfg: Flask app config.
+    :type cfg: Config
+    :return: ["<java>", <java options>..., "-jar", "<ProductClient.jar>"]
+    :rtype: List[str]
+    """
+    java_opts = cfg.get('JavaOptions') or []
+    if isinstance(java_opts, str):
+        java_opts = shlex.split(java_opts)
+    return [cfg['Java'], *java_opts, '-jar', cfg['ProductClient']]
+
+
+def _log_product_client_output(stdout_value: bytes) -> None:
+    """
+    Logs the tail of ProductClient's output.  Verbose sends can print a lot
+    and the send result is reported at the end, so only the last
+    PRODUCT_CLIENT_LOG_TAIL_BYTES bytes are decoded and logged.
+    :param stdout_value: Captured ProductClient stdout (and stderr).
+    :type stdout_value: bytes
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    tail = stdout_value[-PRODUCT_CLIENT_LOG_TAIL_BYTES:]
+    logger.info(
+        'ProductClient output tail: %s',
+        tail.decode('utf-8', 'replace')
+    )
+
+
 def transferWithPDL(source: str,
                     code: str,
                     typeOfFile: str,
@@ -508,30 +704,25 @@ def transferWithPDL(source: str,
         from the file extension. The file is added at the root level of
         the product.
     """
-    PDLScriptParameters = []
-    PDLScriptParameters.append(current_app.config.get('Java'))
-    PDLScriptParameters.append("-jar")
-    PDLScriptParameters.append(current_app.config.get('ProductClient'))
-    PDLScriptParameters.append("--send")
-    PDLScriptParameters.append("--source=" + source)
-    PDLScriptParameters.append("--type=" + typeOfFile)
-    PDLScriptParameters.append("--code=" + source + code)
-    PDLScriptParameters.append("--eventsource=" + source)
-    PDLScriptParameters.append("--eventsourcecode=" + code)
-    PDLScriptParameters.append("--property-review-status=reviewed")
-    PDLScriptParameters.append("--status=" + status)
-    PDLScriptParameters.append("--file=" + fileToSend)
-    PDLScriptParameters.append(
-        "--privateKey=" + current_app.config.get('SSHPrivateKey')
-    )
-    if extraParameters:
-        # extra parameters have been included, and will be appended
-        for param in extraParameters:
-            PDLScriptParameters.append(param)
-
-    PDLScriptParameters.append(
-        "--configFile=" + current_app.config.get("ProductClientConfig")
-    )
+    cfg = current_app.config
+    private_key = cfg['SSHPrivateKey']
+    client_config = cfg['ProductClientConfig']
+    PDLScriptParameters = [
+        *_product_client_cmd(cfg),
+        '--send',
+        f'--source={source}',
+        f'--type={typeOfFile}',
+        f'--code={source}{code}',
+        f'--eventsource={source}',
+        f'--eventsourcecode={code}',
+        '--property-review-status=reviewed',
+        f'--status={status}',
+        f'--file={fileToSend}',
+        f'--privateKey={private_key}',
+        # extra parameters (if included) are added before the config file
+        *(extraParameters or ()),
+        f'--configFile={client_config}'
+    ]
 
     PDLsend = "PDL TRANSMISSION FOR EVENT ID %s -- PARAMETERS:  %s" % (
         code,
@@ -540,15 +731,16 @@ def transferWithPDL(source: str,
 
     logger.info(PDLsend)
 
-    proc = subprocess.Popen(
+    proc = subprocess.run(
         PDLScriptParameters,
-        stdin=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
+        stderr=subprocess.STDOUT,
+        check=False
     )
-    stdout_value, stderr_value = proc.communicate()
+    stdout_value, stderr_value = proc.stdout, proc.stderr
     if stdout_value:
-        logger.info(stdout_value)
+        _log_product_client_output(stdout_value)
     if stderr_value:
         logger.error(stderr_value)
 
@@ -564,28 +756,22 @@ def associateWithPDL(eventSource: str, eventSourceCode: str,
     :param otherEventSourceCode: Event ID of the RSN solution to be associated
     :rtype: None
     """
-    PDLScriptParameters = []
-    PDLScriptParameters.append(current_app.config.get('Java'))
-    PDLScriptParameters.append("-jar")
-    PDLScriptParameters.append(current_app.config.get('ProductClient'))
-    PDLScriptParameters.append("--send")
-    PDLScriptParameters.append("--source=" + eventSource)
-    PDLScriptParameters.append("--code=" + eventSource + eventSourceCode)
-    PDLScriptParameters.append("--type=associate")
-    PDLScriptParameters.append("--eventsource=" + eventSource)
-    PDLScriptParameters.append("--eventsourcecode=" + eventSourceCode)
-    PDLScriptParameters.append(
-        "--property-othereventsource=" + otherEventSource
-    )
-    PDLScriptParameters.append(
-        "--property-othereventsourcecode=" + otherEventSourceCode
-    )
-    PDLScriptParameters.append(
-        "--privateKey=" + current_app.config.get('SSHPrivateKey')
-    )
-    PDLScriptParameters.append(
-        "--configFile=" + current_app.config.get("ProductClientConfig")
-    )
+    cfg = current_app.config
+    private_key = cfg['SSHPrivateKey']
+    client_config = cfg['ProductClientConfig']
+    PDLScriptParameters = [
+        *_product_client_cmd(cfg),
+        '--send',
+        f'--source={eventSource}',
+        f'--code={eventSource}{eventSourceCode}',
+        '--type=associate',
+        f'--eventsource={eventSource}',
+        f'--eventsourcecode={eventSourceCode}',
+        f'--property-othereventsource={otherEventSource}',
+        f'--property-othereventsourcecode={otherEventSourceCode}',
+        f'--privateKey={private_key}',
+        f'--configFile={client_config}'
+    ]
 
     logger.info(
         "PDL TRANSMISSION FOR EVENT ID %s%s -- PARAMETERS:  %s",
@@ -594,16 +780,16 @@ def associateWithPDL(eventSource: str, eventSourceCode: str,
         PDLScriptParameters
     )
 
-    proc = subprocess.Popen(
+    proc = subprocess.run(
         PDLScriptParameters,
-        stdin=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
+        stderr=subprocess.STDOUT,
+        check=False
     )
-    stdout_value, stderr_value = proc.communicate()
+    stdout_value, stderr_value = proc.stdout, proc.stderr
     if stdout_value:
-        stdoutDecoded = stdout_value.decode("utf-8")
-        logger.info(stdoutDecoded)
+        _log_product_client_output(stdout_value)
     if stderr_value:
         logger.error(stderr_value)
 
@@ -618,23 +804,20 @@ def cancelWithPDL(eventID, message_text: str):
     source, code = split_pdl_event_code(eventID)
 
     quakeMLFile = ComposeQuakeMLCancel(source, code)
-    PDLScriptParameters = []
-    PDLScriptParameters.append(current_app.config.get('Java'))
-    PDLScriptParameters.append("-jar")
-    PDLScriptParameters.append(current_app.config.get('ProductClient'))
-    PDLScriptParameters.append("--send")
-    PDLScriptParameters.append("--source=" + source)
-    PDLScriptParameters.append("--code=" + source + code)
-    PDLScriptParameters.append(
-        "--mainclass=gov.usgs.earthquake.eids.EIDSInputWedge"
-    )
-    PDLScriptParameters.append("--file=" + quakeMLFile)
-    PDLScriptParameters.append(
-        "--privateKey=" + current_app.config.get('SSHPrivateKey')
-    )
-    PDLScriptParameters.append(
-        "--configFile=" + current_app.config.get("ProductClientConfig")
-    )
+    cfg = current_app.config
+    private_key = cfg['SSHPrivateKey']
+    client_config = cfg['ProductClientConfig']
+
+    # Leading ProductClient args shared by both parts of the cancel message.
+    # Each part appends its own args, keeping the original arg order.
+    common_params = [*_product_client_cmd(cfg), '--send', f'--source={source}']
+    PDLScriptParameters = common_params + [
+        f'--code={source}{code}',
+        '--mainclass=gov.usgs.earthquake.eids.EIDSInputWedge',
+        f'--file={quakeMLFile}',
+        f'--privateKey={private_key}',
+        f'--configFile={client_config}'
+    ]
 
     PDLcancel = (f'PDL CANCELLATION FOR EVENT ID {code} '
                  f'-- PARAMETERS: {PDLScriptParameters}')
@@ -642,29 +825,28 @@ def cancelWithPDL(eventID, message_text: str):
     logger.info(PDLcancel)
 
     '''
-    Setup subprocess for the QuakeML cancel/delete message.
+    Run subprocess for the QuakeML cancel/delete message.
     This message will perform the cancelation of the origin product.
     The follow-up text will be sent as a second transmission.
     '''
-    proc = subprocess.Popen(
+    # Send the cancel/delete message part 1 of 2 (QuakeML).
+    logger.info('Sending PDL cancellation for event id %s part 1 of 2.', code)
+    proc = subprocess.run(
         PDLScriptParameters,
-        stdin=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
+        stderr=subprocess.STDOUT,
+        check=False
     )
-
-    # Send the cancel/delete message part 1 of 2 (QuakeML).
-    logger.info('Sending PDL cancellation for event id %s part 1 of 2.', code)
-    stdout_value, stderr_value = proc.communicate()
+    stdout_value, stderr_value = proc.stdout, proc.stderr
 
     # Init quakeml message transmission failed flag.
     quakeml_tx_failed = False
 
     # Check stdout for successful send, return False on failure.
     if stdout_value:
-        stdoutDecoded = stdout_value.decode("utf-8")
-        logger.info(stdoutDecoded)
-        if not ("send complete" in stdoutDecoded):
+        _log_product_client_output(stdout_value)
+        if b'send complete' not in stdout_value:
             quakeml_tx_failed = True
     if stderr_value:
         logger.error(stderr_value)
@@ -683,49 +865,39 @@ def cancelWithPDL(eventID, message_text: str):
     QuakeML message using the same source+code identifiers. The message text
     payload should be passed into ProductClient's stdin.
     '''
-    PDLScriptParameters = []
-    PDLScriptParameters.append(current_app.config.get('Java'))
-    PDLScriptParameters.append("-jar")
-    PDLScriptParameters.append(current_app.config.get('ProductClient'))
-    PDLScriptParameters.append("--send")
-    PDLScriptParameters.append("--source=" + source)
-    PDLScriptParameters.append("--type=deleted-text")
-    PDLScriptParameters.append("--code=" + source + code)
-    PDLScriptParameters.append("--eventsource=" + source)
-    PDLScriptParameters.append("--eventsourcecode=" + code)
-    PDLScriptParameters.append("--content")
-    PDLScriptParameters.append("--content-type=text/html")
-    PDLScriptParameters.append(
-        "--configFile=" + current_app.config.get('ProductClientConfig')
-    )
+    PDLScriptParameters = common_params + [
+        '--type=deleted-text',
+        f'--code={source}{code}',
+        f'--eventsource={source}',
+        f'--eventsourcecode={code}',
+        '--content',
+        '--content-type=text/html',
+        f'--configFile={client_config}'
+    ]
 
     # Write ProductClient parameter list stdout and log for deleted text.
     PDLcancel = (f'PDL CANCELLATION TEXT FOR EVENT ID {code} '
                  f'-- PARAMETERS: {PDLScriptParameters}')
     logger.info(PDLcancel)
 
-    # Setup subprocess to send the false alert cancel message.
-    proc = subprocess.Popen(
-        PDLScriptParameters,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
-    )
-
     # Run subprocess to send part 2 of 2. Write follow-up text to stdin.
     logger.info('Sending PDL cancellation for event id %s part 2 of 2.', code)
-    stdout_value, stderr_value = proc.communicate(
-        input=message_text.encode('utf-8')
+    proc = subprocess.run(
+        PDLScriptParameters,
+        input=message_text.encode('utf-8'),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        check=False
     )
+    stdout_value, stderr_value = proc.stdout, proc.stderr
 
     # Init deleted text message transmission failed flag.
     deleted_text_tx_failed = False
 
     # Check for successful transmission.
     if stdout_value:
-        stdoutDecoded = stdout_value.decode("utf-8")
-        logger.info(stdoutDecoded)
-        if not ("send complete" in stdoutDecoded):
+        _log_product_client_output(stdout_value)
+        if b'send complete' not in stdout_value:
             deleted_text_tx_failed = True
     if stderr_value:
         logger.error(stderr_value)
@@ -734,16 +906,25 @@ def cancelWithPDL(eventID, message_text: str):
     return not deleted_text_tx_failed
 
 
-def read_quakeml_template() -> ET.ElementTree:
-    ET.register_namespace('', 'http://quakeml.org/xmlns/bed/1.2')
-    ET.register_namespace('catalog', 'http://anss.org/xmlns/catalog/0.1')
-    ET.register_namespace('q', 'http://quakeml.org/xmlns/quakeml/1.2')
+@functools.lru_cache(maxsize=1)
+def _read_quakeml_template_bytes() -> bytes:
+    """
+    Reads the QuakeML template file once.  The template is static, so later
+    calls return the cached file content.
+    :return: QuakeML template file content.
+    :rtype: bytes
+    """
+    with open(QUAKEML_TEMPLATE_PATH, 'rb') as input_xml:
+        return input_xml.read()
+
 
-    # Read QuakeML template file into xml ElementTree object.
-    input_xml = open('../params/QuakeML_EEWTemplate.xml', 'r')
-    tree = ET.parse(input_xml)
-    input_xml.close()
-    return tree
+def read_quakeml_template() -> ET.ElementTree:
+    """
+    Parses the cached QuakeML template into a new (mutable) ElementTree.
+    :return: QuakeML template tree.
+    :rtype: ET.ElementTree
+    """
+    return ET.ElementTree(ET.fromstring(_read_quakeml_template_bytes()))
 
 
 def ComposeQuakeMLCancel(eventSource, eventCode):
@@ -759,39 +940,38 @@ def ComposeQuakeMLCancel(eventSource, eventCode):
     tree = read_quakeml_template()
 
     root = tree.getroot()
-    cancelTime = time.time()
-    cancelDateTime = str(
-        (datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]) + "Z"
+    # Use a single clock reading for both the publicID and creationTime.
+    cancelTime = datetime.now(timezone.utc)
+    cancelDateTime = (
+        f'{cancelTime:%Y-%m-%dT%H:%M:%S}.{cancelTime.microsecond // 1000:03d}Z'
     )
 
-    eventParameters = root.find(
-        '{http://quakeml.org/xmlns/bed/1.2}eventParameters'
-    )
+    eventParameters = root.find(_TAG_EVENT_PARAMETERS)
 
     publicID = "quakeml:ew.anss.org/eventParameters/%s/%i" % (
         eventCode,
-        int(cancelTime)
+        int(cancelTime.timestamp())
     )
     eventParameters.set('publicID', publicID)
 
     # Poplate creationTime element body with cancelDateTime time str
-    eventParameters.find(
-        '{http://quakeml.org/xmlns/bed/1.2}creationInfo'
-    ).find(
-        '{http://quakeml.org/xmlns/bed/1.2}creationTime').text = cancelDateTime
+    eventParameters.find(_TAG_CREATION_INFO).find(
+        _TAG_CREATION_TIME).text = cancelDateTime
 
-    eventTag = eventParameters.find('{http://quakeml.org/xmlns/bed/1.2}event')
+    eventTag = eventParameters.find(_TAG_EVENT)
     publicID = "quakeml:ew.anss.org/event/" + eventCode
     eventTag.set('publicID', publicID)
-    eventTag.set('catalog:eventsource', eventSource)
-    eventTag.set('catalog:eventid', eventCode)
+    eventTag.set(_ATTR_CATALOG_EVENTSOURCE, eventSource)
+    eventTag.set(_ATTR_CATALOG_EVENTID, eventCode)
 
     QuakeMLFile = "builds/QuakeMLBuild_" + eventCode + ".xml"
-    tree.write(
-        QuakeMLFile,
+    quakeml_bytes = ET.tostring(
+        tree.getroot(),
         encoding='UTF-8',
         xml_declaration=True,
         method='xml'
     )
+    with open(QuakeMLFile, 'wb') as quakeml_f:
+        quakeml_f.write(quakeml_bytes)
 
     return QuakeMLFile